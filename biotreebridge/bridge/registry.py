@@ -1,7 +1,55 @@
 import json
+import sys
+import orjson
+from collections import defaultdict
+from functools import lru_cache
 from typing import Dict, List, Optional, Any, Tuple, Set
 
 
+# key order of a mapping template entry; list values are filled in fresh per entry
+_MAPPING_TEMPLATE = {
+    "node": "",
+    "fhir:resourceType": "",
+    "fhir:reference": None,
+    "fhir:validation": None,
+    "fhir:fieldMapping": None,
+    "rdfs:subClassOf": "",
+    "fhir:schema_subClassOf": "",
+    "range_values": None
+}
+
+
+@lru_cache(maxsize=4096)
+def _fhir_key(name: str) -> str:
+    """Return the fhir: prefixed form of a property name"""
+    return name if name.startswith("fhir:") else f"fhir:{name}"
+
+
+def _extract_ids(value: Any, strings: bool = True) -> List[str]:
+    """Collect @id values from a JSON-LD reference, a list of them or a bare string"""
+    if isinstance(value, list):
+        return [v["@id"] if isinstance(v, dict) else v for v in value
+                if (isinstance(v, dict) and "@id" in v) or (strings and isinstance(v, str))]
+    if isinstance(value, dict):
+        return [value["@id"]] if "@id" in value else []
+    if strings and isinstance(value, str):
+        return [value]
+    return []
+
+
+def _intern_refs(value: Any) -> None:
+    """Intern the @id strings of a JSON-LD reference or list of references in place"""
+    for ref in (value if isinstance(value, list) else (value,)):
+        if isinstance(ref, dict) and isinstance(ref.get("@id"), str):
+            ref["@id"] = sys.intern(ref["@id"])
+
+
+def _format_template_entry(entry: Dict) -> str:
+    """Format a mapping template entry one key per line, arrays kept inline"""
+    lines = [f'    {json.dumps(k)}: {json.dumps(v)}' for k, v in entry.items()]
+    return "{\n" + ",\n".join(lines) + "\n  }"
+
+
 class SchemaRegistry:
     """Registry for managing FHIR properties in BioThings schema entities"""
 
@@ -17,24 +65,35 @@ class SchemaRegistry:
     # may have type, required, cardinality allowed rules
     # these depend on the class and entity properties - human intervention is on mappings.json
 
+    __slots__ = ("schema", "verbose", "_id_index", "_indexed_graph")
+
+    _ALLOWED_PROPERTIES = frozenset([
+        "resourceType", "reference", "validation",
+        "path", "system", "use", "type", "cardinality",
+        "required", "profile", "version", "coding", "code",
+        "description", "url", "relationship", "fieldMapping",
+        "schema_subClassOf"
+    ])
+
     def __init__(self, schema_path=None, verbose=False):
         self.schema = None
         self.verbose = verbose
-        self.allowed_properties = [
-            "resourceType", "reference", "validation",
-            "path", "system", "use", "type", "cardinality",
-            "required", "profile", "version", "coding", "code",
-            "description", "url", "relationship", "fieldMapping",
-            "schema_subClassOf"
-        ]
+        self._id_index = {}
+        self._indexed_graph = (None, 0)
         if schema_path:
             self.load_schema(schema_path)
 
+    @property
+    def allowed_properties(self) -> frozenset:
+        """FHIR property names accepted by the registry"""
+        return self._ALLOWED_PROPERTIES
+
     def load_schema(self, schema_path: str) -> Dict:
         """Load a BioThings schema from file"""
         try:
-            with open(schema_path, 'r', encoding='utf-8') as f:
-                self.schema = json.load(f)
+            with open(schema_path, 'rb') as f:
+                self.schema = orjson.loads(f.read())
+            self._reindex()
             if self.verbose:
                 print(f"schema loaded from {schema_path}")
             return self.schema
@@ -46,13 +105,29 @@ class SchemaRegistry:
         if not self.schema:
             raise ValueError("no schema loaded")
         try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(self.schema, f, indent=2)
+            with open(output_path, 'wb') as f:
+                f.write(orjson.dumps(self.schema, option=orjson.OPT_INDENT_2))
             if self.verbose:
                 print(f"schema saved to {output_path}")
         except Exception as e:
             raise ValueError(f"error saving schema: {str(e)}")
 
+    def _reindex(self) -> None:
+        """Build the @id -> node lookup for the loaded graph"""
+        self._id_index = {}
+        graph = self.schema.get("@graph", [])
+        self._indexed_graph = (graph, len(graph))
+        for node in graph:
+            for value in node.values():
+                if isinstance(value, (dict, list)):
+                    _intern_refs(value)
+            if "@id" not in node:
+                continue
+            node_id = node["@id"]
+            if isinstance(node_id, str):
+                node_id = node["@id"] = sys.intern(node_id)
+            self._id_index.setdefault(node_id, node)
+
     def ensure_fhir_context(self) -> None:
         """Ensure FHIR context is in the schema"""
         if not self.schema:
@@ -66,12 +141,19 @@ class SchemaRegistry:
         """Find a node in the schema by its @id"""
         if not self.schema or "@graph" not in self.schema:
             return None
-        if node_id.startswith("bts:"):
-            search_ids = [node_id, node_id[4:]]
-        else:
-            search_ids = [node_id, f"bts:{node_id}"]
-        for node in self.schema["@graph"]:
-            if "@id" in node and node["@id"] in search_ids:
+        graph = self.schema["@graph"]
+        if self._indexed_graph[0] is not graph or self._indexed_graph[1] != len(graph):
+            # schema or graph replaced, or nodes added/removed since the index was built
+            self._reindex()
+        alias = node_id[4:] if node_id.startswith("bts:") else f"bts:{node_id}"
+        for key in (node_id, alias):
+            node = self._id_index.get(key)
+            if node is not None and node.get("@id") == key:
+                return node
+        # fall back to a scan for nodes edited in place, caching the hit
+        for node in graph:
+            if "@id" in node and node["@id"] in (node_id, alias):
+                self._id_index[node["@id"]] = node
                 return node
         return None
 
@@ -79,7 +161,7 @@ class SchemaRegistry:
         """Check if property name is in allowed list"""
         if property_name.startswith("fhir:"):
             property_name = property_name[5:]
-        valid = property_name in self.allowed_properties
+        valid = property_name in self._ALLOWED_PROPERTIES
         if not valid and self.verbose:
             print(f"warning: '{property_name}' is not a recognized fhir property")
         return valid
@@ -91,13 +173,21 @@ class SchemaRegistry:
         if not self.check_valid_fhir_property(property_name):
             return
         self.ensure_fhir_context()
+        node = self._resolve_node(node_id)
+        if node is not None:
+            self._set_fhir_property(node, node_id, _fhir_key(property_name), property_value, update)
+
+    def _resolve_node(self, node_id: str) -> Optional[Dict]:
+        """Find a node, warning when it is missing"""
         node = self.find_node_by_id(node_id)
         if not node:
             if self.verbose:
                 print(f"warning: node '{node_id}' not found in schema")
-            return
-        if not property_name.startswith("fhir:"):
-            property_name = f"fhir:{property_name}"
+            return None
+        return node
+
+    def _set_fhir_property(self, node: Dict, node_id: str, property_name: str, property_value: Any, update: bool) -> None:
+        """Set a fhir: prefixed property on a resolved node"""
         if property_name in node:
             if update:
                 node[property_name] = property_value
@@ -115,12 +205,12 @@ class SchemaRegistry:
         if not self.schema:
             raise ValueError("no schema loaded")
 
-        node = self.find_node_by_id(node_id)
-        if not node:
-            if self.verbose:
-                print(f"warning: node '{node_id}' not found in schema")
-            return
+        node = self._resolve_node(node_id)
+        if node is not None:
+            self._set_field_mapping(node, node_id, field_properties, update)
 
+    def _set_field_mapping(self, node: Dict, node_id: str, field_properties: Dict, update: bool) -> None:
+        """Add or update a field mapping on a resolved node"""
         if "fhir:resourceType" not in node:
             if self.verbose:
                 print(f"warning: node '{node_id}' requires a resourceType before adding field mappings")
@@ -128,31 +218,24 @@ class SchemaRegistry:
 
         property_name = "fhir:fieldMapping"
 
-        field_entry = {}
-        for key, value in field_properties.items():
-            if not key.startswith("fhir:"):
-                key = f"fhir:{key}"
-            field_entry[key] = value
+        field_entry = {_fhir_key(key): value for key, value in field_properties.items()}
 
         if property_name in node:
             if isinstance(node[property_name], list):
-                found = False
-                for i, mapping in enumerate(node[property_name]):
-                    if mapping.get("fhir:path") == field_entry.get("fhir:path"):
-                        if update:
-                            node[property_name][i] = field_entry
-                            found = True
-                            if self.verbose:
-                                print(f"updated field mapping for path '{field_entry.get('fhir:path')}' in node '{node_id}'")
-                        else:
-                            found = True
-                            if self.verbose:
-                                print(f"field mapping for path '{field_entry.get('fhir:path')}' already exists and update=false")
-
-                if not found:
-                    node[property_name].append(field_entry)
+                mappings = node[property_name]
+                path = field_entry.get("fhir:path")
+                positions = [i for i, mapping in enumerate(mappings) if mapping.get("fhir:path") == path]
+                for i in positions:
+                    if update:
+                        mappings[i] = field_entry
+                        if self.verbose:
+                            print(f"updated field mapping for path '{path}' in node '{node_id}'")
+                    elif self.verbose:
+                        print(f"field mapping for path '{path}' already exists and update=false")
+                if not positions:
+                    mappings.append(field_entry)
                     if self.verbose:
-                        print(f"added new field mapping for path '{field_entry.get('fhir:path')}' to node '{node_id}'")
+                        print(f"added new field mapping for path '{path}' to node '{node_id}'")
             else:
                 node[property_name] = [field_entry]
                 if self.verbose:
@@ -167,12 +250,12 @@ class SchemaRegistry:
         if not self.schema:
             raise ValueError("no schema loaded")
 
-        node = self.find_node_by_id(node_id)
-        if not node:
-            if self.verbose:
-                print(f"warning: node '{node_id}' not found in schema")
-            return
+        node = self._resolve_node(node_id)
+        if node is not None:
+            self._drop_field_mapping(node, node_id, field_path)
 
+    def _drop_field_mapping(self, node: Dict, node_id: str, field_path: Optional[str]) -> None:
+        """Remove one or all field mappings from a resolved node"""
         property_name = "fhir:fieldMapping"
 
         if property_name not in node:
@@ -219,13 +302,12 @@ class SchemaRegistry:
                 print(f"warning: node '{node_id}' not found in schema")
             return []
 
-        property_name = "fhir:fieldMapping"
-
-        if property_name not in node:
+        field_mappings = node.get("fhir:fieldMapping")
+        if field_mappings is None:
             return []
 
-        if isinstance(node[property_name], list):
-            return node[property_name]
+        if isinstance(field_mappings, list):
+            return field_mappings
         else:
             if self.verbose:
                 print(f"warning: fieldMapping for node '{node_id}' is not a list")
@@ -235,14 +317,14 @@ class SchemaRegistry:
         """Remove a FHIR property from a node"""
         if not self.schema:
             raise ValueError("no schema loaded")
-        node = self.find_node_by_id(node_id)
-        if not node:
-            if self.verbose:
-                print(f"warning: node '{node_id}' not found in schema")
-            return
+        node = self._resolve_node(node_id)
+        if node is not None:
+            self._drop_fhir_property(node, node_id, property_name)
+
+    def _drop_fhir_property(self, node: Dict, node_id: str, property_name: Optional[str]) -> None:
+        """Remove one or all fhir: properties from a resolved node"""
         if property_name:
-            if not property_name.startswith("fhir:"):
-                property_name = f"fhir:{property_name}"
+            property_name = _fhir_key(property_name)
             if property_name in node:
                 del node[property_name]
                 if self.verbose:
@@ -250,11 +332,10 @@ class SchemaRegistry:
             elif self.verbose:
                 print(f"property {property_name} not found in node '{node_id}'")
         else:
-            removed = 0
-            for key in list(node.keys()):
-                if key.startswith("fhir:"):
-                    del node[key]
-                    removed += 1
+            keys = [key for key in node if key.startswith("fhir:")]
+            for key in keys:
+                del node[key]
+            removed = len(keys)
             if self.verbose and removed > 0:
                 print(f"removed {removed} fhir properties from node '{node_id}'")
             elif self.verbose:
@@ -269,8 +350,7 @@ class SchemaRegistry:
             if self.verbose:
                 print(f"warning: node '{node_id}' not found in schema")
             return None
-        if not property_name.startswith("fhir:"):
-            property_name = f"fhir:{property_name}"
+        property_name = _fhir_key(property_name)
         return node.get(property_name)
 
     def list_fhir_properties(self, node_id: str) -> Dict:
@@ -312,186 +392,143 @@ class SchemaRegistry:
             node_id = node["@id"]
             for key, value in node.items():
                 if key.startswith("fhir:"):
-                    if key not in mappings:
-                        mappings[key] = {}
-                    mappings[key][node_id] = value
+                    mappings.setdefault(key, {})[node_id] = value
         return mappings
 
     def bulk_add_mappings(self, mappings: List[Dict]) -> None:
         """Add multiple FHIR mappings in bulk"""
         if not self.schema:
             raise ValueError("no schema loaded")
+        by_node = defaultdict(list)
         for mapping in mappings:
             node_id = mapping.get("node_id")
             property_name = mapping.get("property")
             value = mapping.get("value")
-            update = mapping.get("update", True)
             if not node_id or not property_name or value is None:
                 if self.verbose:
                     print(f"warning: skipping invalid mapping: {mapping}")
                 continue
-            self.add_fhir_property(node_id, property_name, value, update)
+            if not self.check_valid_fhir_property(property_name):
+                continue
+            by_node[node_id].append((_fhir_key(property_name), value, mapping.get("update", True)))
+        if not by_node:
+            return
+        self.ensure_fhir_context()
+        for node_id, edits in by_node.items():
+            node = self._resolve_node(node_id)
+            if node is None:
+                continue
+            for property_name, value, update in edits:
+                self._set_fhir_property(node, node_id, property_name, value, update)
 
     def bulk_add_field_mappings(self, field_mappings: List[Dict]) -> None:
         """Add multiple field mappings in bulk"""
         if not self.schema:
             raise ValueError("no schema loaded")
+        by_node = defaultdict(list)
         for mapping in field_mappings:
             node_id = mapping.get("node_id")
             field_properties = mapping.get("field_properties")
-            update = mapping.get("update", True)
             if not node_id or not field_properties:
                 if self.verbose:
                     print(f"warning: skipping invalid field mapping: {mapping}")
                 continue
-            self.add_field_mapping(node_id, field_properties, update)
+            by_node[node_id].append((field_properties, mapping.get("update", True)))
+        for node_id, edits in by_node.items():
+            node = self._resolve_node(node_id)
+            if node is None:
+                continue
+            for field_properties, update in edits:
+                self._set_field_mapping(node, node_id, field_properties, update)
 
     def bulk_remove_mappings(self, removals: List[Dict]) -> None:
         """Remove multiple FHIR mappings in bulk"""
         if not self.schema:
             raise ValueError("no schema loaded")
+        by_node = defaultdict(list)
         for removal in removals:
             node_id = removal.get("node_id")
-            property_name = removal.get("property")
             if not node_id:
                 if self.verbose:
                     print(f"warning: skipping invalid removal: {removal}")
                 continue
-            self.remove_fhir_property(node_id, property_name)
+            by_node[node_id].append(removal.get("property"))
+        for node_id, property_names in by_node.items():
+            node = self._resolve_node(node_id)
+            if node is None:
+                continue
+            for property_name in property_names:
+                self._drop_fhir_property(node, node_id, property_name)
 
     def bulk_remove_field_mappings(self, removals: List[Dict]) -> None:
         """Remove multiple field mappings in bulk"""
         if not self.schema:
             raise ValueError("no schema loaded")
+        by_node = defaultdict(list)
         for removal in removals:
             node_id = removal.get("node_id")
-            field_path = removal.get("field_path")
             if not node_id:
                 if self.verbose:
                     print(f"warning: skipping invalid field mapping removal: {removal}")
                 continue
-            self.remove_field_mapping(node_id, field_path)
+            by_node[node_id].append(removal.get("field_path"))
+        for node_id, field_paths in by_node.items():
+            node = self._resolve_node(node_id)
+            if node is None:
+                continue
+            for field_path in field_paths:
+                self._drop_field_mapping(node, node_id, field_path)
 
     def create_mapping_template(self, output_path: str) -> Tuple[List[Dict], Set[str]]:
         """Create a mapping template excluding schema:rangeIncludes values"""
         if not self.schema:
             raise ValueError("no schema loaded")
 
+        graph = self.schema.get("@graph", [])
         range_includes_values = set()
-        if "@graph" in self.schema:
-            for node in self.schema["@graph"]:
-                if "schema:rangeIncludes" in node:
-                    range_values = node["schema:rangeIncludes"]
-                    if isinstance(range_values, list):
-                        for range_val in range_values:
-                            if isinstance(range_val, dict) and "@id" in range_val:
-                                range_includes_values.add(range_val["@id"])
-                    elif isinstance(range_values, dict) and "@id" in range_values:
-                        range_includes_values.add(range_values["@id"])
-
         property_range_values = {}
-        if "@graph" in self.schema:
-            for node in self.schema["@graph"]:
-                if "@id" not in node:
-                    continue
-
-                node_id = node["@id"]
-                if "schema:rangeIncludes" in node:
-                    range_values = []
-                    range_data = node["schema:rangeIncludes"]
-
-                    if isinstance(range_data, list):
-                        for val in range_data:
-                            if isinstance(val, dict) and "@id" in val:
-                                range_values.append(val["@id"])
-                    elif isinstance(range_data, dict) and "@id" in range_data:
-                        range_values.append(range_data["@id"])
-
-                    if range_values:
-                        property_range_values[node_id] = range_values
-
         subclass_relations = {}
-        for node in self.schema.get("@graph", []):
+        for node in graph:
+            has_id = "@id" in node
+            if "schema:rangeIncludes" in node:
+                range_values = _extract_ids(node["schema:rangeIncludes"], strings=False)
+                range_includes_values.update(range_values)
+                if has_id and range_values:
+                    property_range_values[node["@id"]] = range_values
+            if has_id and "rdfs:subClassOf" in node:
+                parent_classes = _extract_ids(node["rdfs:subClassOf"])
+                if parent_classes:
+                    subclass_relations[node["@id"]] = parent_classes[0]
+
+        mappings = []
+        for node in graph:
             if "@id" not in node:
                 continue
-
             node_id = node["@id"]
+            if node_id in range_includes_values:
+                continue
 
-            if "rdfs:subClassOf" in node:
-                subclass_info = node["rdfs:subClassOf"]
-
-                if isinstance(subclass_info, list):
-                    parent_classes = []
-                    for parent in subclass_info:
-                        if isinstance(parent, dict) and "@id" in parent:
-                            parent_classes.append(parent["@id"])
-                        elif isinstance(parent, str):
-                            parent_classes.append(parent)
-                    if parent_classes:
-                        subclass_relations[node_id] = parent_classes[0]
-                elif isinstance(subclass_info, dict) and "@id" in subclass_info:
-                    subclass_relations[node_id] = subclass_info["@id"]
-                elif isinstance(subclass_info, str):
-                    subclass_relations[node_id] = subclass_info
+            htan_subclass = subclass_relations.get(node_id, "")
+            range_values = property_range_values.get(node_id, [])
 
-        mappings = []
-        if "@graph" in self.schema:
-            for node in self.schema["@graph"]:
-                if "@id" not in node:
-                    continue
-
-                node_id = node["@id"]
-                if node_id in range_includes_values:
-                    continue
-
-                htan_subclass = subclass_relations.get(node_id, "")
-                range_values = property_range_values.get(node_id, [])
-
-                mapping_entry = {
-                    "node": node_id,
-                    "fhir:resourceType": "",
-                    "fhir:reference": [{"fhir:resourceType": "", "focus": ""}],
-                    "fhir:validation": [{"fhir:type": "", "fhir:required": "", "fhir:cardinality": ""}],
-                    "fhir:fieldMapping": [{"fhir:filed": ""}],
-                    "rdfs:subClassOf": htan_subclass,
-                    "fhir:schema_subClassOf": "",
-                    "range_values": range_values
-                }
-
-                mappings.append(mapping_entry)
-
-        def format_json(obj, indent=0):
-            if isinstance(obj, dict):
-                items = []
-                for k, v in obj.items():
-                    if k in ["fhir:reference", "fhir:validation", "fhir:fieldMapping"] and isinstance(v, list):
-                        array_str = json.dumps(v)
-                        items.append(f'{" " * (indent + 2)}"{k}": {array_str}')
-                    else:
-                        value_str = format_json(v, indent + 2)
-                        items.append(f'{" " * (indent + 2)}"{k}": {value_str}')
-                return "{\n" + ",\n".join(items) + "\n" + (" " * indent) + "}"
-            elif isinstance(obj, list):
-                if len(obj) == 0:
-                    return "[]"
-                if all(isinstance(x, (str, int, float, bool)) or x is None for x in obj):
-                    return json.dumps(obj)
-                else:
-                    items = [format_json(item, indent + 2) for item in obj]
-                    return "[\n" + ",\n".join(f"{' ' * (indent + 2)}{item}" for item in items) + "\n" + (" " * indent) + "]"
-            else:
-                return json.dumps(obj)
-
-        with open(output_path, 'w') as f:
-            json_str = "[\n"
-            for i, mapping in enumerate(mappings):
-                formatted = format_json(mapping, 2)
-                if i < len(mappings) - 1:
-                    json_str += f"  {formatted},\n"
-                else:
-                    json_str += f"  {formatted}\n"
-            json_str += "]"
-            f.write(json_str)
+            mapping_entry = _MAPPING_TEMPLATE.copy()
+            mapping_entry["node"] = node_id
+            mapping_entry["fhir:reference"] = [{"fhir:resourceType": "", "focus": ""}]
+            mapping_entry["fhir:validation"] = [{"fhir:type": "", "fhir:required": "", "fhir:cardinality": ""}]
+            mapping_entry["fhir:fieldMapping"] = [{"fhir:filed": ""}]
+            mapping_entry["rdfs:subClassOf"] = htan_subclass
+            mapping_entry["range_values"] = range_values
+
+            mappings.append(mapping_entry)
+
+        last = len(mappings) - 1
+        with open(output_path, 'wb') as f:
+            f.write(b"[\n")
+            f.writelines(
+                f"  {_format_template_entry(mapping)}{',' if i < last else ''}\n".encode()
+                for i, mapping in enumerate(mappings)
+            )
+            f.write(b"]")
 
         if self.verbose:
             print(f"Created mapping template with {len(mappings)} nodes at {output_path}")
@@ -505,14 +542,15 @@ class SchemaRegistry:
             raise ValueError("no schema loaded")
 
         try:
-            with open(mapping_path, 'r') as f:
-                mappings = json.load(f)
+            with open(mapping_path, 'rb') as f:
+                mappings = orjson.loads(f.read())
 
             if self.verbose:
                 print(f"Loaded {len(mappings)} mappings from {mapping_path}")
         except Exception as e:
             raise ValueError(f"Error loading mapping template: {str(e)}")
 
+        context_ready = False
         for mapping in mappings:
             node_id = mapping.get("node")
             if not node_id:
@@ -520,29 +558,44 @@ class SchemaRegistry:
                     print("Warning: Skipping mapping without node ID")
                 continue
 
+            # template keys are all in the allowed list, so they skip check_valid_fhir_property
+            properties = []
             resource_type = mapping.get("fhir:resourceType")
             if resource_type:
-                self.add_fhir_property(node_id, "resourceType", resource_type)
+                properties.append(("fhir:resourceType", resource_type))
 
             reference = mapping.get("fhir:reference")
             if reference and isinstance(reference, list) and len(reference) > 0:
                 if any(isinstance(ref, dict) and ref.get("fhir:resourceType") for ref in reference):
-                    self.add_fhir_property(node_id, "reference", reference)
+                    properties.append(("fhir:reference", reference))
 
             validation = mapping.get("fhir:validation")
             if validation and isinstance(validation, list) and len(validation) > 0:
                 if any(isinstance(val, dict) for val in validation):
-                    self.add_fhir_property(node_id, "validation", validation)
+                    properties.append(("fhir:validation", validation))
 
+            field_entries = []
             field_mappings = mapping.get("fhir:fieldMapping")
             if field_mappings and isinstance(field_mappings, list) and len(field_mappings) > 0:
-                for field_mapping in field_mappings:
-                    if isinstance(field_mapping, dict) and any(field_mapping.values()):
-                        self.add_field_mapping(node_id, field_mapping)
+                field_entries = [fm for fm in field_mappings if isinstance(fm, dict) and any(fm.values())]
 
             fhir_subclass = mapping.get("fhir:schema_subClassOf")
+
+            if not properties and not field_entries and not fhir_subclass:
+                continue
+            if (properties or fhir_subclass) and not context_ready:
+                self.ensure_fhir_context()
+                context_ready = True
+
+            node = self._resolve_node(node_id)
+            if node is None:
+                continue
+            for property_name, value in properties:
+                self._set_fhir_property(node, node_id, property_name, value, True)
+            for field_mapping in field_entries:
+                self._set_field_mapping(node, node_id, field_mapping, True)
             if fhir_subclass:
-                self.add_fhir_property(node_id, "schema_subClassOf", fhir_subclass)
+                self._set_fhir_property(node, node_id, "fhir:schema_subClassOf", fhir_subclass, True)
 
         if self.verbose:
             print("Mapping template applied to schema")
\ No newline at end of file
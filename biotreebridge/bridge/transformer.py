@@ -1,5 +1,6 @@
 import re
 import logging
+from functools import lru_cache
 from typing import Optional
 from fhir.resources.patient import Patient
 from fhir.resources.specimen import Specimen, SpecimenCollection
@@ -26,15 +27,50 @@ from fhir.resources.quantity import Quantity
 from fhir.resources.timing import Timing, TimingRepeat
 from fhir.resources.range import Range
 
-import uuid
-from uuid import uuid3, uuid5, NAMESPACE_DNS
-
 from biotreebridge.bridge import utils
 
+_UUID_RE = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+
+
+@lru_cache(maxsize=4096)
+def _split_path(path: str) -> tuple:
+    """split a dotted FHIR path once"""
+    return tuple(path.split('.'))
+
 
 class FHIRTransformer:
     """FHIR transformer class with common functionality"""
 
+    # shared, read-only constants; defined once per class rather than per instance
+    SYSTEM_HTAN = 'humantumoratlas.org'
+    SYSTEM_SNOME = 'http://snomed.info/sct'
+    SYSTEM_LOINC = 'http://loinc.org'
+    SYSTEM_chEMBL = 'https://www.ebi.ac.uk/chembl'
+    SYSTEM_UBERON = 'http://purl.obolibrary.org/obo/'
+    NAMESPACE_HTAN = utils.NAMESPACE_HTAN
+    lab_category = [
+        {
+            "coding": [
+                {
+                    "system": "http://terminology.hl7.org/CodeSystem/observation-category",
+                    "code": "laboratory",
+                    "display": "laboratory"
+                }
+            ],
+            "text": "Laboratory"
+        }
+    ]
+    med_admin_code = {
+        "coding": [
+            {
+                "system": "http://loinc.org",
+                "code": "80565-5",
+                "display": "Medication administration record"
+            }
+        ],
+        "text": "Medication administration record"
+    }
+
     def __init__(self, registry, subprogram_name: str | None, subproject_name: str | None, out_dir: str, verbose: bool):
         self.registry = registry
         self.subprogram_name = subprogram_name if subprogram_name else "HTAN_BForePC"
@@ -46,41 +82,11 @@ class FHIRTransformer:
         self.get_chembl_compund_info = utils.get_chembl_compound_info
         self.out_dir = out_dir
         self.verbose = verbose
-        self.SYSTEM_HTAN = 'humantumoratlas.org'
-        self.SYSTEM_SNOME = 'http://snomed.info/sct'
-        self.SYSTEM_LOINC = 'http://loinc.org'
-        self.SYSTEM_chEMBL = 'https://www.ebi.ac.uk/chembl'
-        self.SYSTEM_UBERON = 'http://purl.obolibrary.org/obo/'
-        self.NAMESPACE_HTAN = uuid3(NAMESPACE_DNS, self.SYSTEM_HTAN)
-        self.lab_category = [
-            {
-                "coding": [
-                    {
-                        "system": "http://terminology.hl7.org/CodeSystem/observation-category",
-                        "code": "laboratory",
-                        "display": "laboratory"
-                    }
-                ],
-                "text": "Laboratory"
-            }
-        ]
-        self.med_admin_code = {
-            "coding": [
-                {
-                    "system": "http://loinc.org",
-                    "code": "80565-5",
-                    "display": "Medication administration record"
-                }
-            ],
-            "text": "Medication administration record"
-        }
+        self._field_lookups = {}
         # parent researchstudy of all HTAN sub-programs and sub-projects
         # possible subprogram https://github.com/ncihtan/htan2_project_setup/blob/main/projects.yml
         parent_researchstudy_identifier = Identifier(**{"system": self.SYSTEM_HTAN, "use": "official", "value": "HTAN"})
-        parent_researchstudy_id = self.mint_id(identifier=parent_researchstudy_identifier,
-                                               resource_type="ResearchStudy",
-                                               project_id="HTAN", namespace=self.NAMESPACE_HTAN)
-        self.program_research_study = ResearchStudy(**{"id": parent_researchstudy_id,
+        self.program_research_study = ResearchStudy(**{"id": utils.PROGRAM_RESEARCHSTUDY_ID,
                                                        "identifier": [parent_researchstudy_identifier],
                                                        "name": "HTAN",
                                                        "status": "open"}) # todo: check status
@@ -97,17 +103,12 @@ class FHIRTransformer:
     def is_valid_uuid(value: str) -> bool:
         if value is None:
             return False
-        try:
-            _obj = uuid.UUID(value, version=5)
-        except ValueError:
-            return False
-        return True
+        return _UUID_RE.fullmatch(value) is not None
 
 
     def map_field(self, source_entity, source_field, target_resource, value, url, use, other: dict):
         """map a single field using registry"""
-        path = self.registry.get_field_path(source_entity, source_field)
-        metadata = self.registry.get_field_metadata(source_entity, source_field)
+        path, metadata = self._field_lookup(source_entity, source_field)
 
         if not path:
             return
@@ -120,6 +121,16 @@ class FHIRTransformer:
         else:
             self._map_simple_field(target_resource, path, value)
 
+    def _field_lookup(self, source_entity, source_field):
+        """registry path and metadata for a source field, looked up once per transformer"""
+        key = (source_entity, source_field)
+        lookup = self._field_lookups.get(key)
+        if lookup is None:
+            lookup = (self.registry.get_field_path(source_entity, source_field),
+                      self.registry.get_field_metadata(source_entity, source_field))
+            self._field_lookups[key] = lookup
+        return lookup
+
     def _map_identifier(self, resource, path, value, metadata):
         """map a field to a FHIR identifier"""
         if "identifier" not in resource:
@@ -145,19 +156,12 @@ class FHIRTransformer:
 
     def _map_simple_field(self, resource, path, value):
         """map a field to a simple FHIR path"""
-        path_parts = path.split('.')
+        path_parts = _split_path(path)
 
-        if len(path_parts) == 1:
-            resource[path] = value
-        else:
-            current = resource
-            for i, part in enumerate(path_parts):
-                if i == len(path_parts) - 1:
-                    current[part] = value
-                else:
-                    if part not in current:
-                        current[part] = {}
-                    current = current[part]
+        current = resource
+        for part in path_parts[:-1]:
+            current = current.setdefault(part, {})
+        current[path_parts[-1]] = value
 
 
 class PatientTransformer(FHIRTransformer):
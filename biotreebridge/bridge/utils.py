@@ -1,26 +1,27 @@
 import os
+import re
 import orjson
 import sqlite3
-import json
 import gzip
 import uuid
+import hashlib
 from importlib.resources import files
 import importlib
 from pathlib import Path
 from fhir.resources.identifier import Identifier
 from fhir.resources import get_fhir_model_class
-from fhir.resources.group import Group, GroupMember
-from fhir.resources.reference import Reference
-from fhir.resources.codeableconcept import CodeableConcept
 from uuid import uuid5, UUID, uuid3, NAMESPACE_DNS
 from typing import List
 from fhir.resources.fhirresourcemodel import FHIRAbstractModel
 import decimal
-from collections import defaultdict
+from collections import defaultdict, Counter
+from functools import lru_cache
 
 
 project_id = "HTAN2_BForePC"
 NAMESPACE_HTAN = uuid3(NAMESPACE_DNS, 'humantumoratlas.org')
+# strings convert_value_to_float turns into numbers: optional sign, digits, at most one dot
+_NUMERIC_RE = re.compile(r'-?(?:\d+(?:\.\d*)?|\.\d+)')
 
 
 def mint_id(identifier, resource_type, project_id, namespace) -> str:
@@ -35,16 +36,26 @@ def mint_id(identifier, resource_type, project_id, namespace) -> str:
 
 def _mint_id(identifier_string: str, project_id: str, namespace: UUID) -> str:
     """Create a UUID from an identifier, insert project_id."""
-    return str(uuid5(namespace, f"{project_id}/{identifier_string}"))
+    # uuid5 inlined: sha1 over namespace + name, then version/variant bits, without UUID objects
+    digest = bytearray(hashlib.sha1(namespace.bytes + f"{project_id}/{identifier_string}".encode(),
+                                    usedforsecurity=False).digest()[:16])
+    digest[6] = (digest[6] & 0x0F) | 0x50
+    digest[8] = (digest[8] & 0x3F) | 0x80
+    h = digest.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+# id of the parent HTAN ResearchStudy, same as minting Identifier(system=humantumoratlas.org, value=HTAN)
+PROGRAM_RESEARCHSTUDY_ID = _mint_id("ResearchStudy/humantumoratlas.org|HTAN", "HTAN", NAMESPACE_HTAN)
 
 
 def fhir_ndjson(entity, out_path):
     if isinstance(entity, list):
-        with open(out_path, 'w', encoding='utf8') as file:
-            file.write('\n'.join(map(lambda e: json.dumps(e, ensure_ascii=False), entity)))
+        with open(out_path, 'wb') as file:
+            file.write(b"".join(orjson.dumps(e) + b"\n" for e in entity))
     else:
-        with open(out_path, 'w', encoding='utf8') as file:
-            file.write(json.dumps(entity, ensure_ascii=False))
+        with open(out_path, 'wb') as file:
+            file.write(orjson.dumps(entity))
 
 
 def is_valid_fhir_resource_type(resource_type):
@@ -55,20 +66,22 @@ def is_valid_fhir_resource_type(resource_type):
         return False
 
 
+_DTYPE_MAP = {
+    **dict.fromkeys(['int64', 'int32', 'int16', 'int'], 'int'),
+    **dict.fromkeys(['float64', 'float32', 'float16', 'float'], 'float'),
+    **dict.fromkeys(['str', 'string'], 'string'),
+    'bool': 'bool',
+    **dict.fromkeys(['datetime64[ns]', 'timedelta64[ns]', 'period', 'datetime', 'date'], 'dateTime'),
+}
+
+
 def get_data_types(data_type):
-    if data_type in ['int64', 'int32', 'int16', 'int']:
-        return 'int'
-    elif data_type in ['float64', 'float32', 'float16', 'float']:
-        return 'float'
-    elif data_type in ['str', 'string']:
-        return 'string'
-    elif data_type == 'bool':
-        return 'bool'
-    elif data_type in ['datetime64[ns]', 'timedelta64[ns]', 'period', 'datetime', 'date']:
-        return 'dateTime'
-    else:
+    # str() so numpy dtype objects hit the same keys they compared equal to before
+    mapped = _DTYPE_MAP.get(str(data_type))
+    if mapped is None:
         print(f"New or Null Data type: {data_type}.")
         return data_type
+    return mapped
 
 
 def create_or_extend(new_items, folder_path='META', resource_type='Observation', update_existing=False):
@@ -82,8 +95,10 @@ def create_or_extend(new_items, folder_path='META', resource_type='Observation',
     existing_data = {}
 
     if file_existed:
-        with open(file_path, 'r') as file:
+        with open(file_path, 'rb') as file:
             for line in file:
+                if not line.strip():
+                    continue
                 try:
                     item = orjson.loads(line)
                     existing_data[item.get("id")] = item
@@ -95,9 +110,8 @@ def create_or_extend(new_items, folder_path='META', resource_type='Observation',
         if new_item_id not in existing_data or update_existing:
             existing_data[new_item_id] = new_item
 
-    with open(file_path, 'w') as file:
-        for item in existing_data.values():
-            file.write(orjson.dumps(item).decode('utf-8') + '\n')
+    with open(file_path, 'wb') as file:
+        file.write(b"".join(orjson.dumps(item) + b"\n" for item in existing_data.values()))
 
     if file_existed:
         if update_existing:
@@ -112,11 +126,7 @@ def get_chembl_compound_info(db_file_path: str, drug_names: list, limit: int) ->
     """Query Chembl COMPOUND_RECORDS by COMPOUND_NAME to make FHIR Substance"""
     assert drug_names, "The drug_names list is empty. Please provide at least one drug name."
 
-    if len(drug_names) == 1:
-        _drug_names = f"('{drug_names[0].upper()}')"
-    else:
-        _drug_names = tuple([x.upper() for x in drug_names])
-
+    placeholders = ", ".join("?" * len(drug_names))
     query = f"""
     SELECT DISTINCT 
         a.CHEMBL_ID,
@@ -133,92 +143,88 @@ def get_chembl_compound_info(db_file_path: str, drug_names: list, limit: int) ->
         compound_records as cr ON a.MOLREGNO = cr.MOLREGNO
     LEFT JOIN
         source as sr ON cr.SRC_ID = sr.SRC_ID
-    WHERE cr.COMPOUND_NAME IN {_drug_names}
-    LIMIT {limit};
+    WHERE cr.COMPOUND_NAME IN ({placeholders})
+    LIMIT ?;
     """
+    params = [x.upper() for x in drug_names] + [limit]
 
     conn = sqlite3.connect(db_file_path)
-    cursor = conn.cursor()
-    cursor.execute(query)
-    rows = cursor.fetchall()
-
-    conn.close()
+    try:
+        conn.execute("PRAGMA query_only = 1")
+        rows = conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
 
     return rows
 
-def create_researchstudy_group(patient_references: list, study_name: str, project_id: str, namespace) -> Group:
+def create_researchstudy_group(patient_references: list, study_name: str, project_id: str, namespace) -> dict:
     """Creates a research study group based on FHIR NCPI WG standards:
     https://nih-ncpi.github.io/ncpi-fhir-ig-2/StructureDefinition-research-study-group.html
+    Built as FHIR JSON directly; study_groups validates it before writing.
     """
-    code = CodeableConcept(**{"coding": [{"code": "C142710",
-                                          "system": "http://purl.obolibrary.org/obo/ncit.owl",
-                                          "display": "Study Participant"}]})
-
-    patients_ids = [p.reference.replace("Patient/", "") for p in patient_references]
-    group_identifier = Identifier(
-        **{"system": "".join(["https://humantumoratlas.org/", "sample_group"]),
-           "value": "/".join([study_name] + patients_ids),
-           "use": "official"})
-
-    group_id = mint_id(identifier=group_identifier, resource_type="Group",
-                       project_id=project_id,
-                       namespace=namespace)
-
-    patient_members = [GroupMember(**{'entity': p}) for p in patient_references]
-    study_group = Group(**{"id": group_id, "identifier": [group_identifier],
-                           "code": code, "membership": "definitional",
-                           "type": "person", "member": patient_members})
-    return study_group
+    references = [p["reference"] if isinstance(p, dict) else p.reference for p in patient_references]
+    patients_ids = [r.removeprefix("Patient/") for r in references]
+    group_system = "https://humantumoratlas.org/sample_group"
+    group_value = "/".join([study_name] + patients_ids)
+    group_id = _mint_id(f"Group/{group_system}|{group_value}", project_id, namespace)
+
+    return {
+        "resourceType": "Group",
+        "id": group_id,
+        "identifier": [{"use": "official", "system": group_system, "value": group_value}],
+        "type": "person",
+        "membership": "definitional",
+        "code": {"coding": [{"system": "http://purl.obolibrary.org/obo/ncit.owl",
+                             "code": "C142710",
+                             "display": "Study Participant"}]},
+        "member": [{"entity": {"reference": r}} for r in references]
+    }
 
 
 def load_ndjson(path):
     try:
-        with open(path, 'r') as file:
-            obj = [json.loads(line) for line in file]
-            return obj
-    except json.JSONDecodeError as e:
+        return list(iter_ndjson(path))
+    except orjson.JSONDecodeError as e:
         print(e)
 
-def study_groups(meta_path: str, out_path: str) -> List[Group]:
+def study_groups(meta_path: str, out_path: str) -> List[dict]:
     assert os.path.exists(meta_path), "META folder for ResearchStudy, ResearchSubject, and Patient ndjson files path doesn't exist."
     assert os.path.exists(out_path), "Path Does not exist."
 
-    researchstudy = load_ndjson(os.path.join(meta_path, "ResearchStudy.ndjson"))
-    researchsubjects = load_ndjson(os.path.join(meta_path, "ResearchSubject.ndjson"))
-    patients = load_ndjson(os.path.join(meta_path, "Patient.ndjson"))
-
     study_info = {}
-    for study in researchstudy:
+    for study in iter_ndjson(os.path.join(meta_path, "ResearchStudy.ndjson")):
         submitter_id = [r['value'] for r in study['identifier'] if r['use'] == 'official'][0]
         study_info.update({study['id']: submitter_id})
 
+    # index subjects by study and count patient rows once instead of rescanning per study
+    patient_counts = Counter(patient['id'] for patient in iter_ndjson(os.path.join(meta_path, "Patient.ndjson")))
+    subjects_by_study = defaultdict(list)
+    for researchstubject in iter_ndjson(os.path.join(meta_path, "ResearchSubject.ndjson")):
+        subjects_by_study[researchstubject['study']['reference'].removeprefix("ResearchStudy/")].append(researchstubject)
+
     l = []
-    groups = []
+    groups_by_id = {}
     for study_id, study_submitter_id in study_info.items():
         study_researchsubjects = {study_id: []}
         study_patient_references = []
         study_group = None
-        for researchstubject in researchsubjects:
-            if researchstubject['study']['reference'].replace("ResearchStudy/", "") == study_id:
-                for patient in patients:
-                    if researchstubject["subject"]['reference'].replace("Patient/", "") == patient['id']:
-                        study_researchsubjects[study_id].append(researchstubject['id'])
-                        study_patient_references.append(Reference(**({"reference": f"Patient/{patient['id']}"})))
+        for researchstubject in subjects_by_study.get(study_id, []):
+            patient_id = researchstubject["subject"]['reference'].removeprefix("Patient/")
+            for _ in range(patient_counts.get(patient_id, 0)):
+                study_researchsubjects[study_id].append(researchstubject['id'])
+                study_patient_references.append({"reference": f"Patient/{patient_id}"})
         if len(study_patient_references) > 0:
             study_group = create_researchstudy_group(study_patient_references, study_name=study_submitter_id, project_id=project_id, namespace=NAMESPACE_HTAN)
         if study_group:
             print(f"Created Group for {study_submitter_id}")
-            groups.append(study_group)
+            # the same id can only come from the same study and members, so the first one wins
+            groups_by_id.setdefault(study_group['id'], study_group)
         print(f"ReseachStudy: {study_submitter_id} with N = {len(study_researchsubjects[study_id])} ResearchSubjects.")
         l.append(study_researchsubjects)
 
-    json_groups = [orjson.loads(group.model_dump_json()) for group in groups]
-
-    def deduplicate_entities(_entities):
-        return list({v['id']: v for v in _entities}.values())
-
-    json_groups = deduplicate_entities(json_groups)
-    fhir_ndjson(json_groups, f"{out_path}/Group.ndjson")
+    # validate once here rather than per member while building
+    groups = clean_resources(groups_by_id.values())
+    fhir_ndjson(groups, f"{out_path}/Group.ndjson")
     print(f"Successfully transformed HTAN cases info to FHIR's ResearchSubject's Group ndjson file!")
 
     return groups
@@ -300,17 +306,56 @@ def convert_value_to_float(data):
     return data
 
 
+def coerce_numeric_values(data):
+    """
+    Single in-place pass doing convert_decimal_to_float and convert_value_to_float together.
+    """
+    if isinstance(data, decimal.Decimal):
+        return float(data)
+    # sniff: whether 'value' strings of child dicts are converted, as convert_value_to_float
+    # does not descend into a dict once it has a 'value' key
+    stack = [(data, True)]
+    while stack:
+        obj, sniff = stack.pop()
+        if isinstance(obj, dict):
+            for key, value in obj.items():
+                if isinstance(value, decimal.Decimal):
+                    obj[key] = float(value)
+                elif isinstance(value, dict):
+                    if sniff and 'value' in value:
+                        number = value['value']
+                        if isinstance(number, str) and _NUMERIC_RE.fullmatch(number):
+                            value['value'] = float(number) if "." in number else int(number)
+                        stack.append((value, False))
+                    else:
+                        stack.append((value, sniff))
+                elif isinstance(value, list):
+                    stack.append((value, sniff))
+        elif isinstance(obj, list):
+            for i, item in enumerate(obj):
+                if isinstance(item, decimal.Decimal):
+                    obj[i] = float(item)
+                elif isinstance(item, (dict, list)):
+                    stack.append((item, sniff))
+    return data
+
+
+@lru_cache(maxsize=None)
+def _resource_class(resource_type: str):
+    """Import and cache the fhir.resources model class for a resource type"""
+    resource_module = importlib.import_module(f"fhir.resources.{resource_type.lower()}")
+    return getattr(resource_module, resource_type)
+
+
 def validate_fhir_resource_from_type(resource_type: str, resource_data: dict) -> FHIRAbstractModel:
     """
     Generalized function to validate any FHIR resource type using its name.
     """
     try:
-        resource_module = importlib.import_module(f"fhir.resources.{resource_type.lower()}")
-        resource_class = getattr(resource_module, resource_type)
-        return resource_class.model_validate(resource_data)
-
+        resource_class = _resource_class(resource_type)
     except (ImportError, AttributeError) as e:
         raise ValueError(f"Invalid resource type: {resource_type}. Error: {str(e)}")
+    return resource_class.model_validate(resource_data)
 
 
 def clean_resources(entities):
@@ -319,38 +364,41 @@ def clean_resources(entities):
         resource_type = resource["resourceType"]
         cleaned_resource_dict = remove_empty_dicts(resource)
         try:
-            validated_resource = validate_fhir_resource_from_type(resource_type, cleaned_resource_dict).model_dump_json()
+            validated_resource = validate_fhir_resource_from_type(resource_type, cleaned_resource_dict).model_dump(mode='json')
         except ValueError as e:
             print(f"Validation failed for {resource_type}: {e}")
             continue
-        # handle pydantic Decimal cases
-        validated_resource = convert_decimal_to_float(orjson.loads(validated_resource))
-        validated_resource = convert_value_to_float(validated_resource)
-        validated_resource = orjson.loads(orjson.dumps(validated_resource).decode("utf-8"))
+        # handle pydantic Decimal cases and numeric 'value' strings in one pass
+        validated_resource = coerce_numeric_values(validated_resource)
         cleaned_resource.append(validated_resource)
 
     return cleaned_resource
 
 
-def read_ndjson(file_path):
+def iter_ndjson(file_path):
     """
-    Load an NDJSON file.
+    Lazily yield the objects of an NDJSON file, gzipped or not, skipping blank lines.
     """
-    data = []
     open_func = gzip.open if file_path.endswith('.gz') else open
-    with open_func(file_path, 'rt', encoding='utf-8') as f:
+    with open_func(file_path, 'rb') as f:
         for line in f:
-            data.append(json.loads(line))
-    return data
+            if line.strip():
+                yield orjson.loads(line)
+
+
+def read_ndjson(file_path):
+    """
+    Load an NDJSON file.
+    """
+    return list(iter_ndjson(file_path))
 
 
 def consolidate_fhir_data(base_dir, output_dir):
     """Load, deduplicate, and integrate FHIR NDJSON files from META folders."""
     def save_ndjson(data, file_path):
         """Save data to an NDJSON file, ensuring it is unique."""
-        with open(file_path, 'w', encoding='utf-8') as f:
-            for entry in data:
-                f.write(json.dumps(entry) + "\n")
+        with open(file_path, 'wb') as f:
+            f.write(b"".join(orjson.dumps(entry) + b"\n" for entry in data))
 
     resource_data = defaultdict(dict)  # {resource_type: {id: resource}}
 
@@ -363,12 +411,9 @@ def consolidate_fhir_data(base_dir, output_dir):
                 if file.endswith('.ndjson') or file.endswith('.ndjson.gz'):
                     resource_type = file.split('.')[0]
                     file_path = os.path.join(meta_path, file)
-                    resource_id = None
                     try:
-                        data = read_ndjson(file_path)
-                        for entry in data:
+                        for entry in iter_ndjson(file_path):
                             resource_id = entry.get('id')
-
                             if resource_id:
                                 resource_data[resource_type][resource_id] = entry
 
@@ -386,16 +431,17 @@ def consolidate_fhir_data(base_dir, output_dir):
 
 
 def add_extension(entity, extension):
-    if isinstance(entity, list):
-        return [add_extension(item, extension) for item in entity]
-
     if isinstance(entity, dict):
-        if "extension" in entity and isinstance(entity["extension"], list):
-            entity["extension"].append(extension)
+        extensions = entity.get("extension")
+        if isinstance(extensions, list):
+            extensions.append(extension)
         else:
             entity["extension"] = [extension]
         return entity
 
+    if isinstance(entity, list):
+        return [add_extension(item, extension) for item in entity]
+
     if hasattr(entity, "extension"):
         if entity.extension and isinstance(entity.extension, list):
             entity.extension.append(extension)
@@ -406,31 +452,31 @@ def add_extension(entity, extension):
     raise ValueError(f"Unsupported entity type: {type(entity)}")
 
 
-def assign_part_of(entity, research_study_id):
-    part_of_study_extension = {
-        "url": "http://fhir-aggregator.org/fhir/StructureDefinition/part-of-study", # TODO: check url namespace
-        "valueReference": {"reference": f"ResearchStudy/{research_study_id}"}
-    }
+PART_OF_STUDY_URL = "http://fhir-aggregator.org/fhir/StructureDefinition/part-of-study"  # TODO: check url namespace
 
-    def get_extension_url(ext):
-        if isinstance(ext, dict):
-            return ext.get("url")
-        return getattr(ext, "url", None)
 
-    if isinstance(entity, dict):
-        extensions = entity.get("extension", [])
-    elif hasattr(entity, "extension"):
-        extensions = entity.extension if entity.extension else []
-    elif isinstance(entity, list):
+def assign_part_of(entity, research_study_id):
+    if isinstance(entity, list):
         for item in entity:
             assign_part_of(item, research_study_id)
         return entity
+
+    if isinstance(entity, dict):
+        extensions = entity.get("extension") or []
+    elif hasattr(entity, "extension"):
+        extensions = entity.extension or []
     else:
         raise ValueError(f"Unsupported entity type: {type(entity)}")
 
-    if not any(get_extension_url(ext) == part_of_study_extension["url"] for ext in extensions):
-        add_extension(entity, part_of_study_extension)
+    for ext in extensions:
+        url = ext.get("url") if isinstance(ext, dict) else getattr(ext, "url", None)
+        if url == PART_OF_STUDY_URL:
+            return entity
 
+    add_extension(entity, {
+        "url": PART_OF_STUDY_URL,
+        "valueReference": {"reference": f"ResearchStudy/{research_study_id}"}
+    })
     return entity
 
 
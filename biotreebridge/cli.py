@@ -1,7 +1,9 @@
+import os
 import click
-import json
-from biotreebridge.schema_parser.parser import BioThingsSchemaParser
-from biotreebridge.bridge.registry import SchemaRegistry
+import orjson
+
+# the parser and registry (and requests with them) are imported inside each command
+# so that --help and shell completion only pay for click
 
 
 @click.group()
@@ -30,6 +32,8 @@ def fhir_commands():
               help='Enable verbose output.')
 def create_mapping_template(source, output, verbose):
     """Create a FHIR mapping template from schema"""
+    from biotreebridge.bridge.registry import SchemaRegistry
+
     registry = SchemaRegistry(schema_path=source, verbose=verbose)
 
     try:
@@ -59,6 +63,14 @@ def create_mapping_template(source, output, verbose):
               help='Enable verbose output.')
 def apply_mapping(source, mapping, output, verbose):
     """Apply FHIR mappings to schema"""
+    from biotreebridge.bridge.registry import SchemaRegistry
+
+    # fail before loading the schema if the result could not be saved
+    output_dir = os.path.dirname(output) or "."
+    if not os.access(output_dir, os.W_OK):
+        click.echo(f"Error applying mappings: cannot write to {output_dir}", err=True)
+        raise click.Abort()
+
     registry = SchemaRegistry(schema_path=source, verbose=verbose)
 
     try:
@@ -86,11 +98,15 @@ def generate_tree(source, output, parent, max_depth, include_attributes):
     if max_depth != -1 and max_depth < 0:  # ensure max_depth is either -1 or a non-negative integer
         raise click.BadParameter("max_depth must be either -1 (no limit) or a positive integer.")
 
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+
+    from biotreebridge.schema_parser.parser import BioThingsSchemaParser
+
     parser = BioThingsSchemaParser(source)
     tree = parser.get_children_hierarchy(parent, max_depth, include_attributes)
 
-    with open(output, "w", encoding="utf-8") as fp:
-        json.dump(tree, fp, indent=2, ensure_ascii=False)
+    with open(output, "wb") as fp:
+        fp.write(orjson.dumps(tree, option=orjson.OPT_INDENT_2))
     print(f"➜ {output} written")
 
 
@@ -98,16 +114,16 @@ def generate_tree(source, output, parent, max_depth, include_attributes):
 @click.option('--source', '-s', default='schema.json',
               help='Schema source (URL or file). Default is schema.json generated via curl -s https://raw.githubusercontent.com/ncihtan/data-models/main/HTAN.model.jsonld | jq . > schema.json.')
 def list_roots(source):
+    from biotreebridge.schema_parser.parser import BioThingsSchemaParser
+
     parser = BioThingsSchemaParser(source)
     roots = parser.get_roots()
 
-    print(f"found {len(roots)} root nodes:")
-    for root in sorted(roots):
-        name = parser.get_name(root)
-        if name != root:
-            print(f"  {name} ({root})")
-        else:
-            print(f"  {root}")
+    roots = sorted(roots)
+    lines = [f"found {len(roots)} root nodes:"]
+    lines.extend(f"  {name} ({root})" if name != root else f"  {root}"
+                 for root, name in zip(roots, parser.get_names(roots)))
+    print("\n".join(lines))
 
 
 @schema_commands.command('search')
@@ -119,27 +135,25 @@ def list_roots(source):
               help='Save results to JSON file')
 def search_nodes(source, term, output):
     """search nodes by name"""
+    from biotreebridge.schema_parser.parser import BioThingsSchemaParser
+
     parser = BioThingsSchemaParser(source)
     results = parser.search(term)
 
-    formatted_results = []
-    for node_id in results:
-        name = parser.get_name(node_id)
-        formatted_results.append({"id": node_id, "name": name})
+    formatted_results = [{"id": node_id, "name": name}
+                         for node_id, name in zip(results, parser.get_names(results))]
 
     if results:
-        print(f"found {len(results)} nodes matching '{term}':")
-        for res in formatted_results:
-            if res["name"] != res["id"]:
-                print(f"  {res['name']} ({res['id']})")
-            else:
-                print(f"  {res['id']}")
+        lines = [f"found {len(results)} nodes matching '{term}':"]
+        lines.extend(f"  {res['name']} ({res['id']})" if res["name"] != res["id"] else f"  {res['id']}"
+                     for res in formatted_results)
+        print("\n".join(lines))
     else:
         print(f"no nodes found matching '{term}'")
 
     if output:
-        with open(output, "w", encoding="utf-8") as fp:
-            json.dump(formatted_results, fp, indent=2, ensure_ascii=False)
+        with open(output, "wb") as fp:
+            fp.write(orjson.dumps(formatted_results, option=orjson.OPT_INDENT_2))
         print(f"➜ {output} written")
 
 
@@ -1,3 +1,4 @@
+import os
 import uuid
 import json
 import warnings
@@ -12,6 +13,8 @@ import inflection
 import itertools
 import pandas as pd
 from . import utils
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import importlib.resources
 from uuid import uuid3, NAMESPACE_DNS
@@ -48,10 +51,38 @@ from fhir.resources.range import Range
 from fhir.resources.quantity import Quantity
 
 
+# extensions of a file name, from the first dot of its last path segment; mimetypes only looks at these
+_FILE_SUFFIXES_RE = r'[^/.][^./]*(\.[^/]*)$'
+
+
+@lru_cache(maxsize=None)
+def _guess_mime_type(suffixes) -> Optional[str]:
+    """mimetypes.guess_type for a file name's extensions, computed once per distinct extension chain"""
+    if not isinstance(suffixes, str):
+        return None
+    return mimetypes.guess_type("file" + suffixes)[0]
+
+
+# component type tags for the value types table cells come in as; other types go through get_data_types
+_COMPONENT_TYPES = {t: utils.get_data_types(t.__name__)
+                    for t in (int, float, str, bool, np.int64, np.int32, np.int16, np.float64, np.float32, np.float16)}
+
+
+@lru_cache(maxsize=None)
+def _component_key(field: str) -> str:
+    """observation component code for a table column: spaces and dashes become underscores"""
+    return field.replace(" ", "_").replace("-", "_")
+
+
 # File data on synapse after authentication
 # https://github.com/Sage-Bionetworks/synapsePythonClient?tab=readme-ov-file#store-a-file-to-synapse
 
 
+def _build_transformer(transformer_cls, subprogram_name: str, out_dir: str, verbose: bool):
+    """process-pool worker for HTANTransformer.build_many; subclasses only take keyword arguments"""
+    return transformer_cls(subprogram_name=subprogram_name, out_dir=out_dir, verbose=verbose)
+
+
 class HTANTransformer:
     def __init__(self, subprogram_name: str, out_dir: str, verbose: bool):
         self.mint_id = utils.mint_id
@@ -119,6 +150,9 @@ class HTANTransformer:
             Path(importlib.resources.files('fhirizer').parent / 'resources' / 'htan_resources' / 'files.json'))
         assert Path(self.files_path).is_file(), f"Path {self.files_path} does not exist."
 
+        # mapping files are parsed once here; the get_*_mappings accessors hand out the same dicts
+        self._cases_mappings = self.read_json(self.cases_path)
+        self._cases_component_fields = self.index_component_fields(self._cases_mappings)
         self.cases_mappings = self.get_cases_mappings
 
         # cases_mappings
@@ -132,6 +166,8 @@ class HTANTransformer:
         self.cases = self.get_dataframe(self.cases_table_data_path, sep="\t")
         self.patient_identifier_field = "HTAN Participant ID"  # identifiers of the cases matrix/df
 
+        self._biospecimen_mappings = self.read_json(self.biospecimens_path)
+        self._biospecimen_component_fields = self.index_component_fields(self._biospecimen_mappings)
         self.biospecimen_mappings = self.get_biospecimen_mappings
 
         # biospecimens_mapping
@@ -144,6 +180,8 @@ class HTANTransformer:
         self.biospecimens = self.get_dataframe(self.biospecimens_table_data_path, sep="\t")
         self.biospecimen_identifier_field = "HTAN Biospecimen ID"
 
+        self._files_mappings = self.read_json(self.files_path)
+        self._files_component_fields = self.index_component_fields(self._files_mappings)
         self.files_mappings = self.get_files_mappings
 
         # files_mapping
@@ -157,31 +195,52 @@ class HTANTransformer:
         assert self.files_drs_uri_path.is_file(), f"Path {self.files_drs_uri_path} is not a valid file path."
 
         self.files = self.get_dataframe(self.files_table_data_path, sep="\t")
-        self.files_drs_uri = pd.read_csv(self.files_drs_uri_path, sep=",")
+        # cds manifest keyed by file name for the files join below
+        self.files_drs_uri = pd.read_csv(self.files_drs_uri_path, sep=",").set_index("name")
 
         self.patient_demographics = self.get_patient_demographics()
+        # participant id -> minted Patient id; specimens, observations and files ask for the same few patients
+        self._patient_ids = {}
 
         # combine and create standard fhir files metadata
         # print(self.files["Filename"].str.split('/')[1])
-        self.files = self.files[self.files["Filename"].str.contains(
-            '.')]  # NOTE: HTAPP contains file names ex. HTA1_982_7629309080080, that do not have any metadata
-        self.files = self.files[self.files["Filename"].str.contains('/')]
-
-        self.files['mime_type'] = self.files["Filename"].apply(lambda x: mimetypes.guess_type(x)[0])
-        self.files['name'] = self.files["Filename"].str.split('/').apply(lambda x: x[1])
-        self.files_drs_meta = self.files.merge(self.files_drs_uri, how="left", on="name")
+        # NOTE: HTAPP contains file names ex. HTA1_982_7629309080080, that do not have any metadata
+        file_names = self.files["Filename"]
+        self.files = self.files[file_names.str.contains('.', regex=False, na=False)
+                                & file_names.str.contains('/', regex=False, na=False)]
+
+        file_suffixes = self.files["Filename"].str.extract(_FILE_SUFFIXES_RE, expand=False)
+        self.files['mime_type'] = file_suffixes.map(_guess_mime_type)
+        self.files['name'] = self.files["Filename"].str.split('/', n=2).str[1]
+        self.files_drs_meta = self.files.join(self.files_drs_uri, on="name", how="left",
+                                              lsuffix="_x", rsuffix="_y").reset_index(drop=True)
+
+    @classmethod
+    def build_many(cls, subprogram_names: List[str], out_dir: str, verbose: bool, max_workers: Optional[int] = None) -> list:
+        """
+        build one transformer per subprogram in parallel processes; each load (mappings, tables, files metadata)
+        is independent. out_dir may contain a {subprogram_name} placeholder, ex. ./projects/HTAN/{subprogram_name}/META
+        returns the transformers in subprogram_names order; at most os.cpu_count() processes since each holds
+        its subprogram's full tables.
+        """
+        out_dirs = [out_dir.format(subprogram_name=name) for name in subprogram_names]
+        if max_workers is None:
+            max_workers = max(1, min(len(subprogram_names), os.cpu_count() or 1))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(_build_transformer, itertools.repeat(cls), subprogram_names, out_dirs,
+                                     itertools.repeat(verbose)))
 
     def get_cases_mappings(self) -> dict:
         """HTAN cases FHIR mapping"""
-        return self.read_json(self.cases_path)
+        return self._cases_mappings
 
     def get_biospecimen_mappings(self) -> dict:
         """HTAN biospesimens FHIR mapping"""
-        return self.read_json(self.biospecimens_path)
+        return self._biospecimen_mappings
 
     def get_files_mappings(self) -> dict:
         """HTAN files FHIR mapping"""
-        return self.read_json(self.files_path)
+        return self._files_mappings
 
     @staticmethod
     def get_dataframe(_path, sep) -> pd.DataFrame:
@@ -235,6 +294,14 @@ class HTANTransformer:
                 if fhir_mapping is None or _current_fhir_map == fhir_mapping:
                     yield _field, _current_fhir_map, _use, _focus
 
+    @classmethod
+    def index_component_fields(cls, mapping_data) -> dict:
+        """Observation.component fields of a mapping grouped by focus, in mapping order"""
+        fields_by_focus = {}
+        for _field, _fhir_map, _use, _focus in cls.get_fields_by_fhir_map(mapping_data, "Observation.component"):
+            fields_by_focus.setdefault(_focus, []).append(_field)
+        return fields_by_focus
+
     @staticmethod
     def get_fhir_maps_by_field(mapping_data, field_name=None):
         """
@@ -254,13 +321,9 @@ class HTANTransformer:
                     yield _field, _fhir_map, _use, _focus
 
     def get_field_value(self, _row: pd.Series, mapping_type: str, fhir_field: str) -> dict:
-        mapping_data = None
-        if mapping_type == "case":
-            mapping_data = self.cases_mappings()
-        elif mapping_data == "biospecimen":
-            mapping_data = self.biospecimen_mappings()
-        elif mapping_type == "file":
-            mapping_data = self.files_mappings()
+        mapping_data = {"case": self._cases_mappings,
+                        "biospecimen": self._biospecimen_mappings,
+                        "file": self._files_mappings}.get(mapping_type)
 
         _this_htan_field = None
         for field, fhir_map, use, focus in self.get_fields_by_fhir_map(mapping_data=mapping_data,
@@ -288,6 +351,22 @@ class HTANTransformer:
             deciphered_id = {"participant_id": participant_id, "subsets": _id_substrings}
         return deciphered_id
 
+    @staticmethod
+    def decipher_htan_ids(ids: pd.Series) -> pd.DataFrame:
+        """
+        decipher_htan_id for a whole Series of HTAN IDs at once.
+        returns a DataFrame with participant_id and subsets columns on the same index;
+        participant_id is None where an ID is missing the parts it needs.
+        """
+        subsets = ids.str.split("_")
+        head, second = subsets.str[0], subsets.str[1]
+        participant_ids = head + "_" + second
+        # same rule as decipher_htan_id: the third part is kept only for ids with both 'EXT' and '0000'
+        extended = second.str.contains("EXT", regex=False, na=False) & second.str.contains("0000", regex=False, na=False)
+        participant_ids = participant_ids.where(~extended, participant_ids + "_" + subsets.str[2])
+        participant_ids = participant_ids.astype(object).where(participant_ids.notna(), None)
+        return pd.DataFrame({"participant_id": participant_ids, "subsets": subsets})
+
     def create_observation(self, _row: pd.Series, patient: Optional[Patient], patient_id: Optional[str],
                            specimen: Optional[Specimen], official_focus: str,
                            focus: List[Reference], components: Optional[List], category: Optional[list],
@@ -312,7 +391,7 @@ class HTANTransformer:
         observation_fields = []
 
         if official_focus in ["Patient", "Condition"]:
-            mappings = self.cases_mappings()
+            fields_by_focus = self._cases_component_fields
             code = {
                 "coding": [
                     {
@@ -325,11 +404,11 @@ class HTANTransformer:
             }
 
         elif official_focus in ["MedicationAdministration"]:
-            mappings = self.cases_mappings()
+            fields_by_focus = self._cases_component_fields
             code = self.med_admin_code
 
         elif official_focus in ["DocumentReference"]:
-            mappings = self.files_mappings()
+            fields_by_focus = self._files_component_fields
             code = {
                 "coding": [
                     {
@@ -342,7 +421,7 @@ class HTANTransformer:
             }
 
         elif official_focus in ["Specimen"]:
-            mappings = self.biospecimen_mappings()
+            fields_by_focus = self._biospecimen_component_fields
             code = {
                 "coding": [
                     {
@@ -354,10 +433,7 @@ class HTANTransformer:
                 "text": "Specimen-related information panel"
             }
 
-        for _field, _fhir_map, _use, _focus in self.get_fields_by_fhir_map(mappings,
-                                                                           "Observation.component"):
-            if _focus == official_focus:
-                observation_fields.append(_field)
+        observation_fields.extend(fields_by_focus.get(official_focus, ()))
 
         if not relax:
             _obervation_row = _row[observation_fields] if observation_fields else None
@@ -373,13 +449,11 @@ class HTANTransformer:
                             if not isinstance(value, str) and value.is_integer():
                                 value = int(value)
 
-                            if " " in key:
-                                key = key.replace(" ", "_")
-                            if "-" in key:
-                                key = key.replace("-", "_")
+                            key = _component_key(key)
+                            component_type = _COMPONENT_TYPES.get(type(value)) or self.get_data_types(type(value).__name__)
 
                             _component = self.get_component(key=key, value=value,
-                                                            component_type=self.get_data_types(type(value).__name__),
+                                                            component_type=component_type,
                                                             system=self.SYSTEM_HTAN)
                             components.append(_component)
                     except (ValueError, TypeError):
@@ -416,10 +490,17 @@ class HTANTransformer:
                               "component": components,
                               "specimen": specimen_ref})
 
+    def mint_htan_id(self, resource_type: str, value) -> str:
+        """
+        id of a resource with an HTAN identifier value; same as mint_id on Identifier(system=SYSTEM_HTAN, value=value),
+        for references where the Identifier model itself is not needed
+        """
+        return self._mint_id(f"{resource_type}/{self.SYSTEM_HTAN}|{value}", self.project_id, self.NAMESPACE_HTAN)
+
     def get_patient_id(self, participant_id) -> str:
-        patient_identifier = Identifier(**{"system": self.SYSTEM_HTAN, "value": str(participant_id), "use": "official"})
-        patient_id = self.mint_id(identifier=patient_identifier, resource_type="Patient", project_id=self.project_id,
-                                  namespace=self.NAMESPACE_HTAN)
+        patient_id = self._patient_ids.get(participant_id)
+        if patient_id is None:
+            patient_id = self._patient_ids[participant_id] = self.mint_htan_id("Patient", participant_id)
         return patient_id
 
     @staticmethod
@@ -518,8 +599,11 @@ class HTANTransformer:
 
     def write_ndjson(self, entities):
         resource_type = entities[0].get_resource_type()
-        entities = [orjson.loads(entity.model_dump_json()) for entity in entities]
-        entities = list({v['id']: v for v in entities}.values())
+        # dedupe by id before dumping, so repeated entities are never serialized; the last one wins as before
+        unique_entities = {}
+        for entity in entities:
+            unique_entities[entity.id] = entity
+        entities = [entity.model_dump(mode='json') for entity in unique_entities.values()]
         cleaned_entity = utils.clean_resources(entities)
         utils.fhir_ndjson(cleaned_entity, "".join([self.out_dir, "/", resource_type, ".ndjson"]))
         print(f"Successfully transformed HTAN data to {len(entities)} FHIR {resource_type}(s) @ {"".join([self.out_dir, "/", resource_type, ".ndjson"])}")
@@ -544,10 +628,12 @@ class HTANTransformer:
             drug_df = pd.DataFrame(dat)
             drug_df.columns = ["CHEMBL_ID", "STANDARD_INCHI", "CANONICAL_SMILES", "COMPOUND_NAME"]
 
+            # split the ChEMBL rows by compound once instead of rescanning drug_df per drug
+            drug_infos = dict(tuple(drug_df.groupby("COMPOUND_NAME", sort=False)))
             for drug in drug_names:
-                drug_info = drug_df[drug_df.COMPOUND_NAME.isin([drug])]
-                drug_info["has_info"] = drug_info[['STANDARD_INCHI', 'CANONICAL_SMILES']].notna().any(axis=1)
-                if drug_info["has_info"].any():
+                drug_info = drug_infos.get(drug)
+                has_info = drug_info is not None and drug_info[['STANDARD_INCHI', 'CANONICAL_SMILES']].notna().any(axis=None)
+                if has_info:
                     drug_representations = self.create_substance_definition_representations(drug_info)
                     substance_definition = self.create_substance_definition(compound_name=drug,
                                                                             representations=drug_representations)
@@ -577,16 +663,16 @@ class HTANTransformer:
 
             cases['Medication_ID'] = cases['Therapeutic Agents'].map(drugname_fhir_ids, na_action='ignore')
 
-        for index, row in cases.iterrows():
-            if pd.isnull(row["Therapeutic Agents"]) and not pd.isnull(row["Treatment Type"]):
+        # one placeholder medication per treatment type, mapped back onto every matching case
+        treatment_mask = cases["Therapeutic Agents"].isnull() & cases["Treatment Type"].notnull()
+        if treatment_mask.any():
+            treatment_type_ids = {}
+            for treatment_type in cases.loc[treatment_mask, "Treatment Type"].unique():
                 medication_agent = self.create_medication(compound_name=None, _substance=None,
-                                                          treatment_type=row["Treatment Type"])
-                if medication_agent:
-                    medications.append(medication_agent)
-                    cases.loc[index, 'Medication_ID'] = medication_agent.id
-
-            if row['Therapeutic Agents'] in drugname_fhir_ids.keys():
-                cases.loc[index, 'Medication_ID'] = drugname_fhir_ids[row['Therapeutic Agents']]
+                                                          treatment_type=treatment_type)
+                medications.append(medication_agent)
+                treatment_type_ids[treatment_type] = medication_agent.id
+            cases.loc[treatment_mask, 'Medication_ID'] = cases.loc[treatment_mask, "Treatment Type"].map(treatment_type_ids)
 
         if medications:
             self.write_ndjson(medications)
@@ -1118,11 +1204,7 @@ class SpecimenTransformer(HTANTransformer):
 
         parent_specimen_reference = []
         if not pd.isnull(_row["HTAN Parent ID"]):
-            parent_specimen_identifier = Identifier(
-                **{"system": self.SYSTEM_HTAN, "value": str(_row['HTAN Biospecimen ID']), "use": "official"})
-            parent_specimen_id = self.mint_id(identifier=parent_specimen_identifier, resource_type="Specimen",
-                                              project_id=self.project_id,
-                                              namespace=self.NAMESPACE_HTAN)
+            parent_specimen_id = self.mint_htan_id("Specimen", _row['HTAN Biospecimen ID'])
             parent_specimen_reference.append(Reference(**{"reference": f"Specimen/{parent_specimen_id}"}))
 
         specimen_fields = []
@@ -1205,12 +1287,7 @@ class DocumentReferenceTransformer(HTANTransformer):
 
         parent_data_file = []
         if not pd.isnull(_row["Parent Data File ID"]):
-            parent_document_reference_identifier = Identifier(
-                **{"system": self.SYSTEM_HTAN, "value": str(_row["Parent Data File ID"]), "use": "official"})
-
-            parent_document_reference_id = self.mint_id(identifier=parent_document_reference_identifier,
-                                                        resource_type="DocumentReference", project_id=self.project_id,
-                                                        namespace=self.NAMESPACE_HTAN)
+            parent_document_reference_id = self.mint_htan_id("DocumentReference", _row["Parent Data File ID"])
 
             parent_data_file.append(DocumentReferenceRelatesTo(**{
                 "code": CodeableConcept(**{"coding": [{"code": "parent_data_file",
@@ -1219,12 +1296,7 @@ class DocumentReferenceTransformer(HTANTransformer):
                 "target": Reference(**{"reference": f"Documentreference/{parent_document_reference_id}"})}))
 
         def create_docref_specimen_id(_specimen_identifier_value):
-            specimen_identifier = Identifier(
-                **{"system": self.SYSTEM_HTAN, "value": _specimen_identifier_value, "use": "official"})
-            specimen_id = self.mint_id(identifier=specimen_identifier, resource_type="Specimen",
-                                       project_id=self.project_id,
-                                       namespace=self.NAMESPACE_HTAN)
-            return specimen_id
+            return self.mint_htan_id("Specimen", _specimen_identifier_value)
 
 
         specimen_references = []
@@ -1410,14 +1482,14 @@ def htan2fhir(verbose, entity_atlas_name, spinner):
                                 observations.append(med_admin_observation)
 
         specimens = []
+        specimen_participant_ids = HTANTransformer.decipher_htan_ids(htan_biospecimens["HTAN Biospecimen ID"])["participant_id"]
         for specimen_index, specimen_row in htan_biospecimens.iterrows():
             # specimen_row = htan_biospecimens.iloc[specimen_index]
             specimen = specimen_transformer.create_specimen(_row=specimen_row)
             if specimen:
                 specimens.append(specimen)
 
-                participant_id = specimen_transformer.decipher_htan_id(specimen_row["HTAN Biospecimen ID"])[
-                    "participant_id"]
+                participant_id = specimen_participant_ids.at[specimen_index]
                 assert participant_id, f"Specimen {specimen_row["HTAN Biospecimen ID"]} does not have a patient participant associated with it."
 
                 specimen_participant_id = specimen_transformer.get_patient_id(participant_id=participant_id)
@@ -7,6 +7,7 @@ import json
 import glob
 import gzip
 import uuid
+import hashlib
 import pprint
 import requests
 from bs4 import BeautifulSoup
@@ -24,6 +25,7 @@ from typing import List
 from fhir.resources.fhirresourcemodel import FHIRAbstractModel
 import decimal
 from collections import defaultdict
+from functools import lru_cache
 
 
 
@@ -36,10 +38,10 @@ def _read_json(path):
     """
 
     try:
-        with open(path, encoding='utf-8') as f:
-            this_json = json.load(f)
+        with open(path, 'rb') as f:
+            this_json = orjson.loads(f.read())
             return this_json
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         print("Error decoding JSON: {}".format(e))
 
 
@@ -656,31 +658,35 @@ def get_component(key, value=None, component_type=None,
     else:
         pass
 
-    component = {
-        "code": {
-            "coding": [
-                {
-                    "system": system,
-                    "code": key,
-                    "display": key
-                }
-            ],
-            "text": key
-        }
-    }
+    component = {"code": _component_code(key, system)}
     if value:
         component.update(value)
 
     return component
 
 
+@lru_cache(maxsize=None)
+def _component_code(key, system) -> dict:
+    """shared CodeableConcept dict for a component key; read-only, it is reused by every component with that key"""
+    return {
+        "coding": [
+            {
+                "system": system,
+                "code": key,
+                "display": key
+            }
+        ],
+        "text": key
+    }
+
+
 def fhir_ndjson(entity, out_path):
     if isinstance(entity, list):
-        with open(out_path, 'w', encoding='utf8') as file:
-            file.write('\n'.join(map(lambda e: json.dumps(e, ensure_ascii=False), entity)))
+        with open(out_path, 'wb') as file:
+            file.write(b"".join(orjson.dumps(e) + b"\n" for e in entity))
     else:
-        with open(out_path, 'w', encoding='utf8') as file:
-            file.write(json.dumps(entity, ensure_ascii=False))
+        with open(out_path, 'wb') as file:
+            file.write(orjson.dumps(entity))
 
 
 def mint_id(identifier, resource_type, project_id, namespace) -> str:
@@ -695,7 +701,13 @@ def mint_id(identifier, resource_type, project_id, namespace) -> str:
 
 def _mint_id(identifier_string: str, project_id: str, namespace: UUID) -> str:
     """Create a UUID from an identifier, insert project_id."""
-    return str(uuid5(namespace, f"{project_id}/{identifier_string}"))
+    # uuid5 inlined: sha1 over namespace + name, then version/variant bits, without UUID objects
+    digest = bytearray(hashlib.sha1(namespace.bytes + f"{project_id}/{identifier_string}".encode(),
+                                    usedforsecurity=False).digest()[:16])
+    digest[6] = (digest[6] & 0x0F) | 0x50
+    digest[8] = (digest[8] & 0x3F) | 0x80
+    h = digest.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
 
 
 def is_valid_fhir_resource_type(resource_type):
@@ -790,7 +802,7 @@ def create_researchstudy_group(patient_references: list, study_name: str, projec
                                           "system": "http://purl.obolibrary.org/obo/ncit.owl",
                                           "display": "Study Participant"}]})
 
-    patients_ids = [p.reference.replace("Patient/", "") for p in patient_references]
+    patients_ids = [p.reference.removeprefix("Patient/") for p in patient_references]
     group_identifier = Identifier(
         **{"system": "".join(["https://gdc.cancer.gov/", "sample_group"]),
            "value": "/".join([study_name] + patients_ids),
@@ -821,7 +833,7 @@ def study_groups(meta_path: str, out_path: str) -> List[Group]:
         study_info.update({study['id']: submitter_id})
 
     l = []
-    groups = []
+    groups_by_id = {}
     project_id = "GDC"
     NAMESPACE_GDC = uuid3(NAMESPACE_DNS, 'gdc.cancer.gov')
     for study_id, study_submitter_id in study_info.items():
@@ -829,25 +841,22 @@ def study_groups(meta_path: str, out_path: str) -> List[Group]:
         study_patient_references = []
         study_group = None
         for researchstubject in researchsubjects:
-            if researchstubject['study']['reference'].replace("ResearchStudy/", "") == study_id:
+            if researchstubject['study']['reference'].removeprefix("ResearchStudy/") == study_id:
+                subject_id = researchstubject["subject"]['reference'].removeprefix("Patient/")
                 for patient in patients:
-                    if researchstubject["subject"]['reference'].replace("Patient/", "") == patient['id']:
+                    if subject_id == patient['id']:
                         study_researchsubjects[study_id].append(researchstubject['id'])
                         study_patient_references.append(Reference(**({"reference": f"Patient/{patient['id']}"})))
         if len(study_patient_references) > 0:
             study_group = create_researchstudy_group(study_patient_references, study_name=study_submitter_id, project_id=project_id, namespace=NAMESPACE_GDC)
         if study_group:
             print(f"Created Group for {study_submitter_id}")
-            groups.append(study_group)
+            groups_by_id.setdefault(study_group.id, study_group)
         print(f"ReseachStudy: {study_submitter_id} with N = {len(study_researchsubjects[study_id])} ResearchSubjects.")
         l.append(study_researchsubjects)
 
-    json_groups = [orjson.loads(group.model_dump_json()) for group in groups]
-
-    def deduplicate_entities(_entities):
-        return list({v['id']: v for v in _entities}.values())
-
-    json_groups = deduplicate_entities(json_groups)
+    groups = list(groups_by_id.values())
+    json_groups = [group.model_dump(mode='json') for group in groups]
     fhir_ndjson(json_groups, f"{out_path}/Group.ndjson")
     print(f"Successfully transformed GDC case info to FHIR's ResearchSubject's Group ndjson file!")
 
@@ -1,7 +1,7 @@
-import json
+import orjson
 from collections import defaultdict
+from functools import lru_cache
 from typing import Dict, List, Tuple, Optional, Any, Set
-import requests
 
 
 class BioThingsSchemaParser:
@@ -10,12 +10,15 @@ class BioThingsSchemaParser:
         load JSON‑LD from a URL or a local file path. normalize so that self.graph is always a list of node dicts.
         """
         if source.startswith(("http://", "https://")):
+            # only URL sources need requests, so local files skip importing it
+            import requests
+
             resp = requests.get(source)
             resp.raise_for_status()
-            self.schema = resp.json()
+            self.schema = orjson.loads(resp.content)
         else:
-            with open(source, "r", encoding="utf-8") as fp:
-                self.schema = json.load(fp)
+            with open(source, "rb") as fp:
+                self.schema = orjson.loads(fp.read())
 
         if isinstance(self.schema, list):
             self.graph = self.schema
@@ -26,7 +29,17 @@ class BioThingsSchemaParser:
                     or []
             )
 
+        # subclass links, built on first use and shared by every traversal
+        self._relationships = None
+        # (node_id, lowered name, lowered id) rows for search, built on first search
+        self._search_table = None
+        # @id -> first node with that id, built on first lookup
+        self._node_index = None
+        # @id -> display name, filled in as names are looked up
+        self._name_by_id = {}
+
     @staticmethod
+    @lru_cache(maxsize=4096)
     def _strip_prefix(curie: str) -> str:
         """
         turn txt like "bts:Sample" into "Sample". if no colon present, returns the string unchanged.
@@ -39,7 +52,11 @@ class BioThingsSchemaParser:
         returns two dicts:
           - parents_to_children: { parent_id: [ child_id, ... ], ... }
           - children_to_parents: { child_id: [ parent_id, ... ], ... }
+        the result is computed once per parser and shared, so treat it as read-only.
         """
+        if self._relationships is not None:
+            return self._relationships
+
         parents_to_children: Dict[str, List[str]] = defaultdict(list)
         children_to_parents: Dict[str, List[str]] = defaultdict(list)
 
@@ -72,7 +89,8 @@ class BioThingsSchemaParser:
                     parents_to_children[pid].append(cid)
                     children_to_parents[cid].append(pid)
 
-        return dict(parents_to_children), dict(children_to_parents)
+        self._relationships = (dict(parents_to_children), dict(children_to_parents))
+        return self._relationships
 
     def get_children(self, parent_id: str, recursive: bool = False) -> List[str]:
         """
@@ -80,7 +98,7 @@ class BioThingsSchemaParser:
         """
         p2c, _ = self.extract_subclass_relationships()
         if not recursive:
-            return p2c.get(parent_id, [])
+            return list(p2c.get(parent_id, []))
         seen, queue, out = {parent_id}, [parent_id], []
         while queue:
             current = queue.pop(0)
@@ -97,7 +115,7 @@ class BioThingsSchemaParser:
         """
         _, c2p = self.extract_subclass_relationships()
         if not recursive:
-            return c2p.get(child_id, [])
+            return list(c2p.get(child_id, []))
         seen, queue, out = {child_id}, [child_id], []
         while queue:
             current = queue.pop(0)
@@ -215,34 +233,47 @@ class BioThingsSchemaParser:
 
     def get_name(self, node_id: str) -> str:
         """retrieve the name for a node based on its ID"""
-        node = next((n for n in self.graph if n.get('@id') == node_id), None)
-        if node:
-            return node.get("rdfs:label") or node.get("schema:name") or node_id
-        return node_id
+        name = self._name_by_id.get(node_id)
+        if name is None:
+            node = self.get_node(node_id)
+            name = (node.get("rdfs:label") or node.get("schema:name") or node_id) if node else node_id
+            self._name_by_id[node_id] = name
+        return name
+
+    def get_names(self, node_ids: List[str]) -> List[str]:
+        """retrieve the names for several node IDs, in order"""
+        name_by_id = self._name_by_id
+        get_name = self.get_name
+        return [name_by_id.get(node_id) or get_name(node_id) for node_id in node_ids]
 
     def search(self, term: str) -> List[str]:
         """
         search for nodes by name or ID. returns a list of matching node IDs.
         """
-        term = term.lower()
-        results = []
-
-        for node in self.graph:
-            node_id = node.get("@id")
-            if not node_id:
-                continue
-            name = node.get("rdfs:label") or node.get("schema:name") or ""
-            if term in name.lower() or term in node_id.lower():
-                results.append(node_id)
+        if self._search_table is None:
+            self._search_table = []
+            for node in self.graph:
+                node_id = node.get("@id")
+                if not node_id:
+                    continue
+                name = node.get("rdfs:label") or node.get("schema:name") or ""
+                self._search_table.append((node_id, name.lower(), node_id.lower()))
 
-        return results
+        term = term.lower()
+        return [node_id for node_id, name, lowered_id in self._search_table
+                if term in name or term in lowered_id]
 
     def get_node(self, node_id: str) -> Optional[Dict[str, Any]]:
         """
         get the node dictionary by its ID.
         returns None if the node is not found.
         """
-        return next((n for n in self.graph if n.get('@id') == node_id), None)
+        if self._node_index is None:
+            self._node_index = {}
+            for node in self.graph:
+                # keep the first match, as the previous linear scan did
+                self._node_index.setdefault(node.get('@id'), node)
+        return self._node_index.get(node_id)
 
     def _extract_reference_ids(self, value: Any) -> List[str]:
         """
@@ -71,6 +71,32 @@ def test_generate_tree_with_max_depth_2(runner, mock_schema_file):
         assert "children" in child
 
 
+def test_generate_tree_creates_output_dir(runner, mock_schema_file, tmp_path):
+    """test the 'tree' command writes into a directory that does not exist yet"""
+    output = tmp_path / "schemas" / "hierarchy.json"
+    result = runner.invoke(
+        cli,
+        ["schema", "tree", "--source", str(mock_schema_file), "--parent", "RPPALevel2", "--output", str(output)],
+    )
+
+    assert result.exit_code == 0
+    with open(output, "r", encoding="utf-8") as f:
+        tree = json.load(f)
+    assert tree["id"] == "RPPALevel2"
+
+
+def test_apply_mapping_unwritable_output(runner, mock_schema_file, tmp_path):
+    """test the 'apply-mapping' command aborts before loading when the output dir is missing"""
+    result = runner.invoke(
+        cli,
+        ["fhir", "apply-mapping", "--source", str(mock_schema_file), "--mapping", str(tmp_path / "mappings.json"),
+         "--output", str(tmp_path / "missing" / "schema_fhir.json")],
+    )
+
+    assert result.exit_code != 0
+    assert "cannot write to" in result.output
+
+
 def test_list_roots(runner, mock_schema_file):
     """test the 'roots' command"""
     result = runner.invoke(
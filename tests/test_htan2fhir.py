@@ -0,0 +1,36 @@
+import os
+import sys
+import pytest
+
+if sys.version_info < (3, 12):
+    pytest.skip("htan2fhir requires python 3.12", allow_module_level=True)
+pytest.importorskip("bs4")
+pytest.importorskip("pandas")
+
+from biotreebridge.initial_transformers.htan2fhir import HTANTransformer
+
+
+class StandInTransformer(HTANTransformer):
+    """records its arguments and the building process instead of loading HTAN tables"""
+
+    def __init__(self, *args, **kwargs):
+        self.subprogram_name = kwargs["subprogram_name"]
+        self.out_dir = kwargs["out_dir"]
+        self.verbose = kwargs["verbose"]
+        self.pid = os.getpid()
+
+
+def test_build_many():
+    """test that build_many builds one transformer per subprogram in order, in worker processes"""
+    names = ["OHSU", "DFCI", "WUSTL"]
+    transformers = StandInTransformer.build_many(names, out_dir="./projects/HTAN/{subprogram_name}/META",
+                                                 verbose=False, max_workers=2)
+    assert [t.subprogram_name for t in transformers] == names
+    assert [t.out_dir for t in transformers] == [f"./projects/HTAN/{name}/META" for name in names]
+    assert all(isinstance(t, StandInTransformer) and t.verbose is False for t in transformers)
+    assert os.getpid() not in {t.pid for t in transformers}
+
+
+def test_build_many_no_subprograms():
+    """test that build_many with no subprograms returns an empty list"""
+    assert StandInTransformer.build_many([], out_dir="out", verbose=False) == []
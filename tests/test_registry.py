@@ -67,6 +67,22 @@ class TestSchemaRegistry:
         assert "@graph" in registry.schema
         assert len(registry.schema["@graph"]) == 4
 
+    def test_find_node_by_id(self, registry):
+        assert registry.find_node_by_id("Patient")["@id"] == "Patient"
+        assert registry.find_node_by_id("bts:Patient")["@id"] == "Patient"
+        assert registry.find_node_by_id("Unknown") is None
+
+    def test_find_node_after_schema_edit(self, registry):
+        registry.schema["@graph"].append({"@id": "Diagnosis", "rdfs:label": "Diagnosis"})
+        assert registry.find_node_by_id("bts:Diagnosis")["@id"] == "Diagnosis"
+        registry.schema["@graph"][0]["@id"] = "Person"
+        assert registry.find_node_by_id("Patient") is None
+        assert registry.find_node_by_id("Person")["@id"] == "Person"
+        registry.schema = {"@graph": [{"@id": "Case"}]}
+        registry.add_fhir_property("Case", "resourceType", "Patient")
+        assert registry.get_fhir_property("Case", "resourceType") == "Patient"
+        assert registry.find_node_by_id("Gender") is None
+
     def test_add_fhir_property(self, registry):
         registry.add_fhir_property("Patient", "resourceType", "Patient")
         property_value = registry.get_fhir_property("Patient", "resourceType")
@@ -83,27 +99,94 @@ class TestSchemaRegistry:
         assert mappings[0]["fhir:path"] == "Patient.identifier.value"
         assert mappings[0]["fhir:system"] == "https://data.humantumoratlas.org/participant"
 
+    def test_update_field_mapping(self, populated_registry):
+        populated_registry.add_field_mapping("HTANParticipantID", {"path": "Patient.identifier.system"})
+        populated_registry.add_field_mapping("HTANParticipantID", {"path": "Patient.identifier.value", "use": "usual"})
+        populated_registry.add_field_mapping("HTANParticipantID", {"path": "Patient.identifier.value", "use": "temp"},
+                                             update=False)
+        mappings = populated_registry.get_field_mappings("HTANParticipantID")
+        assert [m["fhir:path"] for m in mappings] == ["Patient.identifier.value", "Patient.identifier.system"]
+        assert mappings[0] == {"fhir:path": "Patient.identifier.value", "fhir:use": "usual"}
+        mappings[0] = {"fhir:path": "Patient.identifier.use"}
+        populated_registry.add_field_mapping("HTANParticipantID", {"path": "Patient.identifier.value"})
+        assert [m["fhir:path"] for m in populated_registry.get_field_mappings("HTANParticipantID")] == [
+            "Patient.identifier.use", "Patient.identifier.system", "Patient.identifier.value"]
+
     def test_remove_fhir_property(self, populated_registry):
         populated_registry.remove_fhir_property("Patient", "resourceType")
         property_value = populated_registry.get_fhir_property("Patient", "resourceType")
         assert property_value is None
+        populated_registry.find_node_by_id("Gender")["fhir:description"] = "set outside the registry"
+        populated_registry.remove_fhir_property("Gender")
+        assert populated_registry.list_fhir_properties("Gender") == {}
 
     def test_remove_field_mapping(self, populated_registry):
         populated_registry.remove_field_mapping("HTANParticipantID", "Patient.identifier.value")
         mappings = populated_registry.get_field_mappings("HTANParticipantID")
         assert len(mappings) == 0
 
+    def test_bulk_mappings(self, registry):
+        registry.bulk_add_mappings([
+            {"node_id": "Patient", "property": "resourceType", "value": "Patient"},
+            {"node_id": "Gender", "property": "resourceType", "value": "Patient"},
+            {"node_id": "Patient", "property": "description", "value": "a patient"},
+            {"node_id": "Patient", "property": "notAProperty", "value": "x"},
+            {"node_id": "Gender", "property": "resourceType", "value": "Observation", "update": False},
+        ])
+        assert registry.list_fhir_properties("Patient") == {
+            "fhir:resourceType": "Patient", "fhir:description": "a patient"}
+        assert registry.get_fhir_property("Gender", "resourceType") == "Patient"
+        registry.bulk_add_field_mappings([
+            {"node_id": "Gender", "field_properties": {"path": "Patient.gender"}},
+            {"node_id": "Gender", "field_properties": {"path": "Patient.gender", "use": "official"}},
+        ])
+        assert registry.get_field_mappings("Gender") == [{"fhir:path": "Patient.gender", "fhir:use": "official"}]
+        registry.bulk_remove_field_mappings([{"node_id": "Gender", "field_path": "Patient.gender"}])
+        registry.bulk_remove_mappings([{"node_id": "Patient"}, {"node_id": "Gender", "property": "resourceType"}])
+        assert registry.list_fhir_properties("Patient") == {}
+        assert registry.list_fhir_properties("Gender") == {}
+
     def test_list_fhir_properties(self, populated_registry):
         properties = populated_registry.list_fhir_properties("Patient")
         assert "fhir:resourceType" in properties
         assert properties["fhir:resourceType"] == "Patient"
 
+    def test_get_subclass_relationship(self, registry):
+        registry.schema["@graph"][2]["rdfs:subClassOf"] = [{"@id": "Patient"}, {"@id": "Biospecimen"}]
+        assert registry.get_subclass_relationship("Gender") == ["Patient", "Biospecimen"]
+        registry.get_subclass_relationship("Gender").append("Other")
+        assert registry.get_subclass_relationship("bts:Gender") == ["Patient", "Biospecimen"]
+        assert registry.get_subclass_relationship("Patient") == []
+        registry.schema["@graph"][2]["rdfs:subClassOf"] = {"@id": "Biospecimen"}
+        assert registry.get_subclass_relationship("Gender") == ["Biospecimen"]
+
     def test_list_all_fhir_mappings(self, populated_registry):
         all_mappings = populated_registry.list_all_fhir_mappings()
         assert "fhir:resourceType" in all_mappings
         assert "Patient" in all_mappings["fhir:resourceType"]
         assert all_mappings["fhir:resourceType"]["Patient"] == "Patient"
 
+    def test_list_all_fhir_mappings_after_changes(self, populated_registry):
+        populated_registry.remove_fhir_property("Biospecimen")
+        populated_registry.remove_field_mapping("Gender", "Patient.gender")
+        all_mappings = populated_registry.list_all_fhir_mappings()
+        assert "Biospecimen" not in all_mappings["fhir:resourceType"]
+        assert list(all_mappings["fhir:fieldMapping"]) == ["HTANParticipantID"]
+        del populated_registry.find_node_by_id("Gender")["fhir:resourceType"]
+        populated_registry.find_node_by_id("Biospecimen")["fhir:resourceType"] = "Specimen"
+        all_mappings = populated_registry.list_all_fhir_mappings()
+        assert "Gender" not in all_mappings["fhir:resourceType"]
+        assert all_mappings["fhir:resourceType"]["Biospecimen"] == "Specimen"
+        temp_fd, output_path = tempfile.mkstemp(suffix='.json')
+        os.close(temp_fd)
+        try:
+            populated_registry.save_schema(output_path)
+            reloaded = SchemaRegistry(schema_path=output_path)
+            assert reloaded.list_all_fhir_mappings() == all_mappings
+        finally:
+            if os.path.exists(output_path):
+                os.unlink(output_path)
+
     def test_create_mapping_template(self, registry):
         temp_fd, mapping_path = tempfile.mkstemp(suffix='.json')
         os.close(temp_fd)
@@ -123,6 +206,21 @@ class TestSchemaRegistry:
             if os.path.exists(mapping_path):
                 os.unlink(mapping_path)
 
+    def test_create_mapping_template_range_includes(self, registry):
+        registry.schema["@graph"][1]["schema:rangeIncludes"] = [{"@id": "Gender"}]
+        registry.schema["@graph"][1]["rdfs:subClassOf"] = {"@id": "Patient"}
+        temp_fd, mapping_path = tempfile.mkstemp(suffix='.json')
+        os.close(temp_fd)
+        try:
+            mappings, range_values = registry.create_mapping_template(mapping_path)
+            assert range_values == {"Gender"}
+            assert [m["node"] for m in mappings] == ["Patient", "HTANParticipantID", "Biospecimen"]
+            assert mappings[1]["range_values"] == ["Gender"]
+            assert mappings[1]["rdfs:subClassOf"] == "Patient"
+        finally:
+            if os.path.exists(mapping_path):
+                os.unlink(mapping_path)
+
     def test_apply_mapping_template(self, registry):
         temp_fd, mapping_path = tempfile.mkstemp(suffix='.json')
         os.close(temp_fd)